@@ -5,18 +5,81 @@ A Python utility to extract transaction data from German bank statement PDFs.
 """
 import argparse
 import csv
+import hashlib
+import json
+import multiprocessing
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
 
-import pdfplumber
+import pypdfium2 as pdfium
 
 __version__ = "0.1.0"
 __author__ = "MPZ-00"
 
-DATE_RE   = re.compile(r"^(\d{2}\.\d{2}\.\d{4})")
-AMOUNT_RE = re.compile(r"[-+]?\d{1,3}(?:\.\d{3})*,\d{2}")
-STOP_RE = re.compile(r"(Zinsertrag|Neuer Saldo)")
+# ASCII digits only; \d would also accept any Unicode decimal digit
+DATE_PATTERN   = r"[0-9]{2}\.[0-9]{2}\.[0-9]{4}"
+AMOUNT_PATTERN = r"[-+]?[0-9]{1,3}(?:\.[0-9]{3})*,[0-9]{2}"
+
+STOP_RE   = re.compile(r"Zinsertrag|Neuer Saldo")
+# Date at line start followed by the first amount, matched over a whole page
+LINE_RE   = re.compile(
+    r"^[^\S\n]*(" + DATE_PATTERN + r")[^\n]*?(" + AMOUNT_PATTERN + r")",
+    re.MULTILINE,
+)
+# German amount to plain decimal: drop thousands dots, comma becomes the point
+AMOUNT_TRANS = str.maketrans({".": None, ",": "."})
+
+# Bump whenever extraction logic changes in a way that can alter results
+CACHE_FORMAT = 2
+# Cached results are invalidated whenever the extractor or PDFium changes
+CACHE_SALT = "\0".join((
+    str(CACHE_FORMAT),
+    __version__,
+    pdfium.PYPDFIUM_INFO.version,
+    pdfium.PDFIUM_INFO.version,
+    LINE_RE.pattern,
+    STOP_RE.pattern,
+)).encode()
+
+def page_text(page: pdfium.PdfPage) -> str:
+    """Extract the text of a PDF page in visual reading order.
+    
+    PDFium returns text in content-stream order, which differs from the
+    visual order when a statement draws its columns one after another.
+    Text rectangles are grouped into lines by vertical position and each
+    line is read left to right.
+    
+    Args:
+        page: PDFium page
+        
+    Returns:
+        Page text with one visual line per text line
+    """
+    textpage = page.get_textpage()
+    try:
+        # Rectangles are (left, bottom, right, top), ordered top to bottom
+        rects = [textpage.get_rect(i) for i in range(textpage.count_rects())]
+        rects.sort(key=lambda r: -(r[1] + r[3]))
+        
+        lines = []
+        for rect in rects:
+            centre = (rect[1] + rect[3]) / 2
+            if lines and lines[-1][0][1] <= centre <= lines[-1][0][3]:
+                lines[-1].append(rect)
+            else:
+                lines.append([rect])
+                
+        return "\n".join(
+            " ".join(textpage.get_text_bounded(*rect) for rect in sorted(line))
+            for line in lines
+        )
+    finally:
+        textpage.close()
 
 def extract_from_pdf(pdf_path: Path):
     """Extract date and amount pairs from a PDF file.
@@ -32,6 +95,16 @@ def extract_from_pdf(pdf_path: Path):
         PermissionError: If PDF file can't be accessed
         Exception: For other PDF processing errors
     """
+    rows, _ = _extract_from_pdf(pdf_path)
+    return rows
+
+def _extract_from_pdf(pdf_path: Path):
+    """Extract date and amount pairs from a PDF file, see extract_from_pdf.
+    
+    Returns:
+        Tuple of (rows, complete) where complete is False if text could
+        not be extracted from some page
+    """
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF file not found: {pdf_path}")
     
@@ -40,32 +113,44 @@ def extract_from_pdf(pdf_path: Path):
     
     rows = []
     stop = False
+    complete = True
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            if not pdf.pages:
+        with pdfium.PdfDocument(pdf_path) as pdf:
+            if len(pdf) == 0:
                 print(f"Warning: PDF file appears to be empty: {pdf_path}", file=sys.stderr)
-                return rows
+                return rows, complete
                 
-            for page in pdf.pages:
+            for index in range(len(pdf)):
                 if stop:
                     break
                     
+                page = None
                 try:
-                    text = page.extract_text() or ""
+                    page = pdf[index]
+                    text = page_text(page)
                 except Exception as e:
                     print(f"Warning: Could not extract text from page in {pdf_path}: {e}", file=sys.stderr)
+                    complete = False
                     continue
+                finally:
+                    if page is not None:
+                        page.close()
+                    
+                m_stop = STOP_RE.search(text)
+                if m_stop:
+                    # Drop the line holding the stop marker and everything after it
+                    text = text[:text.rfind("\n", 0, m_stop.start()) + 1]
+                    stop = True
                     
-                for line in text.splitlines():
-                    line = line.strip()
-                    if STOP_RE.search(line):
-                        stop = True
-                        break
-                    m_date = DATE_RE.match(line)
-                    m_amount = AMOUNT_RE.search(line)
-                    if m_date and m_amount:
-                        rows.append((m_date.group(1), m_amount.group(0)))
+                # Every amount has a decimal comma; a memchr-backed check lets
+                # pages without one skip the regex scan
+                if "," not in text:
+                    continue
+                    
+                # Statements repeat the same posting dates; interning shares one
+                # string per date, also when rows are pickled back from a worker
+                rows.extend((sys.intern(d), a) for d, a in LINE_RE.findall(text))
                         
     except PermissionError:
         raise PermissionError(f"Permission denied accessing PDF file: {pdf_path}")
@@ -75,11 +160,222 @@ def extract_from_pdf(pdf_path: Path):
         else:
             raise Exception(f"Error processing PDF file {pdf_path}: {e}")
     
+    return rows, complete
+
+def cache_dir() -> Path:
+    """Get the cache directory, following the XDG base directory spec.
+    
+    Resolved on use so runs with --no-cache never look up the home
+    directory.
+    
+    Returns:
+        $XDG_CACHE_HOME/pdf-bank-extractor, by default under ~/.cache
+        
+    Raises:
+        RuntimeError: If the home directory can't be determined
+    """
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "pdf-bank-extractor"
+
+def cache_path(pdf_path: Path) -> Path:
+    """Get the cache file for a PDF file.
+    
+    The name is a BLAKE2b hash of the file content and CACHE_SALT, so
+    renamed or copied files share an entry and edited files get a new one.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Path of the JSON cache file inside cache_dir()
+        
+    Raises:
+        OSError: If the PDF file can't be read
+        RuntimeError: If the home directory can't be determined
+    """
+    h = hashlib.blake2b(CACHE_SALT, digest_size=16)
+    with pdf_path.open("rb") as fh:
+        while chunk := fh.read(1 << 20):
+            h.update(chunk)
+    return cache_dir() / f"{h.hexdigest()}.json"
+
+def extract_from_pdf_cached(pdf_path: Path, refresh: bool = False):
+    """Extract date and amount pairs from a PDF file, reusing earlier results.
+    
+    Errors reading or writing the cache are ignored and only cost a
+    regular extraction. Results of files where some page could not be
+    extracted are not cached, so the next run tries again.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        refresh: Ignore an existing cache entry and replace it
+        
+    Returns:
+        List of (date, amount) tuples
+        
+    Raises:
+        Exception: As raised by extract_from_pdf
+    """
+    try:
+        cache_file = cache_path(pdf_path)
+    except RuntimeError:
+        return extract_from_pdf(pdf_path)
+    except OSError:
+        # Let extract_from_pdf report the problem with the file
+        return extract_from_pdf(pdf_path)
+    
+    if not refresh:
+        try:
+            with cache_file.open(encoding="utf-8") as fh:
+                return [(sys.intern(d), a) for d, a in json.load(fh)]
+        except (OSError, ValueError, TypeError):
+            pass
+    
+    rows, complete = _extract_from_pdf(pdf_path)
+    if not complete:
+        return rows
+    
+    try:
+        # Transaction data: keep the cache readable for the current user only
+        cache_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        cache_file.parent.chmod(0o700)
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with open(fd, "w", encoding="utf-8") as fh:
+                json.dump(rows, fh)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            # Don't leave partial files behind in the cache directory
+            tmp_file.unlink(missing_ok=True)
+            raise
+    except OSError:
+        pass
+    
     return rows
 
+def extract_from_pdf_safe(pdf_path: Path, use_cache: bool = False, refresh: bool = False):
+    """Extract date and amount pairs from a PDF file without raising.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        use_cache: Read and write results through the on-disk cache
+        refresh: Ignore existing cache entries, see extract_from_pdf_cached
+        
+    Returns:
+        Tuple of (pdf_path, rows, error) where error is None on success
+        and the error message otherwise
+    """
+    try:
+        if use_cache:
+            rows = extract_from_pdf_cached(pdf_path, refresh)
+        else:
+            rows = extract_from_pdf(pdf_path)
+        return pdf_path, rows, None
+    except Exception as e:
+        return pdf_path, [], str(e)
+
+def extract_all(files: list[Path], workers: int, use_cache: bool = False, refresh: bool = False):
+    """Extract date and amount pairs from several PDF files.
+    
+    Files are processed in a pool of worker processes when more than one
+    worker and more than one file are given. If the pool can't be started
+    or a worker dies, the remaining files are processed in this process.
+    Results are yielded in the order of ``files`` either way.
+    
+    Args:
+        files: PDF file paths
+        workers: Maximum number of worker processes
+        use_cache: Read and write results through the on-disk cache
+        refresh: Ignore existing cache entries, see extract_from_pdf_cached
+        
+    Yields:
+        Tuples of (pdf_path, rows, error) as returned by extract_from_pdf_safe
+    """
+    extract = partial(extract_from_pdf_safe, use_cache=use_cache, refresh=refresh)
+    
+    if workers <= 1 or len(files) <= 1:
+        yield from map(extract, files)
+        return
+    
+    workers = min(workers, len(files))
+    if sys.platform == "win32":
+        # ProcessPoolExecutor raises ValueError for more than 61 workers on Windows
+        workers = min(workers, 61)
+    chunksize = max(1, len(files) // (workers * 4))
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for result in ex.map(extract, files, chunksize=chunksize):
+                yield result
+                done += 1
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        print(f"Warning: Worker processes failed ({e}), continuing without them", file=sys.stderr)
+        yield from map(extract, files[done:])
+
+def _walk_pdfs(directory: str | Path):
+    """Recursively yield PDF files below a directory.
+    
+    Uses os.scandir so file types come from the directory listing instead
+    of a stat call per entry. Symlinked directories are not followed and
+    unreadable subdirectories are skipped with a warning. Entries whose
+    type can't be determined are yielded so extract_from_pdf reports them.
+    
+    Args:
+        directory: Directory to search
+        
+    Yields:
+        Paths of PDF files
+        
+    Raises:
+        PermissionError: If the directory itself can't be read
+    """
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            it = os.scandir(current)
+        except PermissionError:
+            if current is directory:
+                raise
+            print(f"Warning: Skipping unreadable directory: {current}", file=sys.stderr)
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(".pdf"):
+                    try:
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        pass
+                    yield Path(entry.path)
+
+def is_pdf_file(path: Path) -> bool:
+    """Check whether a file starts like a PDF document.
+    
+    Looks for the ``%PDF-`` header within the first 1024 bytes, where
+    PDF readers accept it.
+    
+    Args:
+        path: File to check
+        
+    Returns:
+        True if the PDF header was found
+        
+    Raises:
+        OSError: If the file can't be read
+    """
+    with path.open("rb") as fh:
+        return b"%PDF-" in fh.read(1024)
+
 def collect_files(file: Path | None, folder: Path | None):
     """Collect PDF files from specified file or folder.
     
+    Files found in the folder are de-duplicated by inode, and files without
+    a PDF header (e.g. empty or misnamed files) are skipped with a warning.
+    Files that can't be read are kept so extract_from_pdf reports them.
+    
     Args:
         file: Single PDF file path
         folder: Folder to search for PDFs recursively
@@ -89,6 +385,7 @@ def collect_files(file: Path | None, folder: Path | None):
         
     Raises:
         FileNotFoundError: If specified file/folder doesn't exist
+        ValueError: If the specified file isn't a PDF
         PermissionError: If folder can't be accessed
     """
     files = []
@@ -100,6 +397,12 @@ def collect_files(file: Path | None, folder: Path | None):
             raise ValueError(f"File is not a PDF: {file}")
         if not file.is_file():
             raise ValueError(f"Path is not a file: {file}")
+        try:
+            if not is_pdf_file(file):
+                raise ValueError(f"File is not a valid PDF: {file}")
+        except OSError:
+            # Leave it to extract_from_pdf to report the error
+            pass
         files.append(file)
         
     if folder:
@@ -109,13 +412,31 @@ def collect_files(file: Path | None, folder: Path | None):
             raise ValueError(f"Path is not a directory: {folder}")
             
         try:
-            pdf_files = list(folder.rglob("*.pdf"))
-            valid_files = [p for p in pdf_files if p.is_file()]
-            files.extend(sorted(valid_files))
+            pdf_files = sorted(_walk_pdfs(folder))
         except PermissionError:
             raise PermissionError(f"Permission denied accessing directory: {folder}")
         except Exception as e:
             raise Exception(f"Error scanning directory {folder}: {e}")
+        
+        seen = {}
+        for pdf in pdf_files:
+            try:
+                st = pdf.stat()
+                # Same file reachable through several links; some filesystems
+                # (e.g. network shares) report no inode numbers at all
+                if st.st_ino:
+                    key = (st.st_dev, st.st_ino)
+                    if key in seen:
+                        print(f"Warning: Skipping {pdf}, same file as {seen[key]}", file=sys.stderr)
+                        continue
+                    seen[key] = pdf
+                if not is_pdf_file(pdf):
+                    print(f"Warning: Skipping file that is not a valid PDF: {pdf}", file=sys.stderr)
+                    continue
+            except OSError:
+                # Leave it to extract_from_pdf to report the error
+                pass
+            files.append(pdf)
     
     return files
 
@@ -131,9 +452,19 @@ def main():
                    help="Output CSV path, default: auszuege.csv")
     p.add_argument("--add-filename", action="store_true",
                    help="Include filename in output")
+    p.add_argument("--numeric", action="store_true",
+                   help="Include amount as plain decimal number (e.g. -1234.56)")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                   help="Number of PDFs processed in parallel, default: number of CPUs")
+    p.add_argument("--no-cache", action="store_true",
+                   help="Do not read or write cached results in $XDG_CACHE_HOME/pdf-bank-extractor")
+    p.add_argument("--force-refresh", action="store_true",
+                   help="Re-extract all PDFs and replace their cached results")
     p.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
 
     args = p.parse_args()
+    if args.jobs < 1:
+        p.error("--jobs must be at least 1")
     
     try:
         files = collect_files(args.file, args.dir)
@@ -158,6 +489,8 @@ def main():
             sys.exit(1)
     
     out_fields = ["Datum", "Betrag"]
+    if args.numeric:
+        out_fields.append("Betrag_numerisch")
     if args.add_filename:
         out_fields.append("Datei")
 
@@ -165,33 +498,32 @@ def main():
     total = 0
     
     try:
-        with args.out.open("w", newline="", encoding="utf-8") as fh:
+        with args.out.open("w", newline="", encoding="utf-8", buffering=1 << 20) as fh:
             writer = csv.writer(fh, delimiter=";")
             writer.writerow(out_fields)
 
-            for pdf in files:
-                try:
-                    rows = extract_from_pdf(pdf)
-                    if not rows:
-                        print(f"Warning: No transactions found in {pdf}", file=sys.stderr)
-                        continue
-                        
-                    for d, a in rows:
-                        if args.add_filename:
-                            writer.writerow([d, a, str(pdf)])
-                        else:
-                            writer.writerow([d, a])
-                        total += 1
-                        
-                except Exception as e:
-                    failed_files.append((pdf, str(e)))
-                    print(f"Error processing {pdf}: {e}", file=sys.stderr)
+            for pdf, rows, error in extract_all(files, args.jobs, not args.no_cache, args.force_refresh):
+                if error is not None:
+                    failed_files.append((pdf, error))
+                    print(f"Error processing {pdf}: {error}", file=sys.stderr)
+                    continue
+                    
+                if not rows:
+                    print(f"Warning: No transactions found in {pdf}", file=sys.stderr)
                     continue
+                    
+                if args.numeric:
+                    rows = [(d, a, a.translate(AMOUNT_TRANS)) for d, a in rows]
+                if args.add_filename:
+                    name = str(pdf)
+                    rows = [row + (name,) for row in rows]
+                writer.writerows(rows)
+                total += len(rows)
 
     except PermissionError:
         print(f"Error: Cannot write to output file: {args.out}", file=sys.stderr)
         sys.exit(1)
-    except Exception as e:
+    except OSError as e:
         print(f"Error writing output file: {e}", file=sys.stderr)
         sys.exit(1)
 
@@ -205,4 +537,5 @@ def main():
             print(f"  {pdf}: {error}", file=sys.stderr)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()